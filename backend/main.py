@@ -1,23 +1,65 @@
 # main.py
 # ATS-like resume backend with multi-resume upload, filter (strict/ranking), CSV export, and compare endpoint.
 import re
-import io
+import asyncio
 import csv
 import uuid
 import os
+import mmap
+import hashlib
 import json
-import pdfplumber
+import copy
+import pypdfium2 as pdfium
+import ahocorasick
 import spacy
+import numpy as np
+from spacy.tokens import Doc
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
 from datetime import datetime
 from io import BytesIO
-from typing import List, Optional, Dict, Any, Union
+from typing import List, Optional, Dict, Any, Set, Tuple, Union
 from fastapi import FastAPI, UploadFile, File, Body, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi.responses import StreamingResponse, JSONResponse, ORJSONResponse
 from pydantic import BaseModel
 
-app = FastAPI(title="ATS-like Resume Filter (Multi-upload)")
+# worker processes for CPU-bound resume parsing (PDF extraction + regex/NLP);
+# each worker imports this module, so it builds its own `nlp` once.
+# Created/shut down by the app lifespan, replaced if a worker dies.
+EXECUTOR: Optional[ProcessPoolExecutor] = None
+
+
+def _new_executor() -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(max_workers=os.cpu_count())
+
+
+def _reset_executor(broken: ProcessPoolExecutor) -> None:
+    # a dead worker (native PDFium crash, OOM kill) breaks the whole pool for good
+    global EXECUTOR
+    if EXECUTOR is broken:  # another request may already have replaced it
+        EXECUTOR = _new_executor()
+        broken.shutdown(wait=False, cancel_futures=True)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global EXECUTOR
+    EXECUTOR = _new_executor()
+    yield
+    EXECUTOR.shutdown(wait=False, cancel_futures=True)
+
+
+# orjson (Rust) serializes the large candidate payloads much faster than json.dumps
+app = FastAPI(
+    title="ATS-like Resume Filter (Multi-upload)",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
+)
 
 UPLOAD_DIR = "uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
@@ -30,8 +72,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# load spacy model once
-nlp = spacy.load("en_core_web_sm")
+# load spacy once: only sentence boundaries are needed, so a blank pipeline
+# with a rule-based sentencizer is enough (no tagger/parser/NER per resume)
+nlp = spacy.blank("en")
+nlp.add_pipe("sentencizer")
 
 # canonical skills list (expand as needed)
 SKILLS = [
@@ -40,10 +84,63 @@ SKILLS = [
     "Machine Learning", "Data Analysis", "Figma", "Adobe Illustrator",
     "UI/UX", "UI Design", "Photoshop", "HTML", "CSS", "Wireframe", "Prototype", "Git"
 ]
+SKILLS_LOW = frozenset(s.lower() for s in SKILLS)
+
+# common soft-skill keywords (used by JD extraction and the keyword index)
+COMMON_KEYWORDS = ["leadership", "communication", "problem solving", "teamwork"]
+
+
+# ---------- multi-term substring matching (Aho–Corasick) ----------
+def build_matcher(terms: List[str]) -> ahocorasick.Automaton:
+    # lowercased term -> original term; one linear pass finds every term in a text
+    automaton = ahocorasick.Automaton()
+    for t in terms:
+        automaton.add_word(t.lower(), t)
+    automaton.make_automaton()
+    return automaton
+
+
+def find_terms(automaton: ahocorasick.Automaton, text_low: str) -> Set[str]:
+    return {orig for _, orig in automaton.iter(text_low)}
+
+
+SKILL_AC = build_matcher(SKILLS)
+KEYWORD_AC = build_matcher(COMMON_KEYWORDS)
+
+
+def detect_skills(text: str) -> List[str]:
+    # canonical skills found in text, in SKILLS order
+    found = find_terms(SKILL_AC, text.lower())
+    return [s for s in SKILLS if s in found]
+
+# in-memory store for parsed resumes, column-oriented (key: candidate_id, str uuid):
+# the filter loop only reads the small columns; display fields live in META
+TEXT_PATHS: Dict[str, str] = {}        # lowercased full text on disk
+SKILL_SETS: Dict[str, frozenset] = {}  # lowercased detected skills
+YEARS: Dict[str, float] = {}           # total experience years
+DEG: Dict[str, Optional[str]] = {}     # detected degree level
+META: Dict[str, Dict[str, Any]] = {}   # filename, contacts, skills, education, file_url, ...
 
-# in-memory store for parsed resumes
-# key: candidate_id (str uuid), value: parsed resume dict
-parsed_resumes: Dict[str, Dict[str, Any]] = {}
+# inverted indexes: lowercased canonical skill / common keyword -> candidate_ids containing it
+SKILL_INDEX: Dict[str, Set[str]] = {}
+KEYWORD_INDEX: Dict[str, Set[str]] = {}
+
+
+def index_resume(candidate_id: str, skills_low: frozenset, keywords_low: frozenset) -> None:
+    for s in skills_low:
+        SKILL_INDEX.setdefault(s, set()).add(candidate_id)
+    for k in keywords_low:
+        KEYWORD_INDEX.setdefault(k, set()).add(candidate_id)
+
+
+def store_resume(candidate_id: str, parsed: Dict[str, Any]) -> None:
+    # split a parsed resume into the store columns + inverted indexes
+    TEXT_PATHS[candidate_id] = parsed.pop("text_path")
+    SKILL_SETS[candidate_id] = parsed.pop("skills_detected_low")
+    YEARS[candidate_id] = float(parsed.get("total_experience_years") or 0.0)
+    DEG[candidate_id] = parsed.pop("degree_level")
+    index_resume(candidate_id, SKILL_SETS[candidate_id], parsed.pop("keywords_detected_low"))
+    META[candidate_id] = parsed
 
 # ---------- helpers for experience parsing & education detection (same robust functions) ----------
 MONTH_MAP = {
@@ -69,12 +166,41 @@ DEGREE_LEVELS = {
     "phd": ["phd", "doctorate", "s3", "dr."]
 }
 
+# rank of each degree level (lowest -> highest) for requirement checks
+DEGREE_ORDER = {"highschool": 0, "diploma": 1, "bachelor": 2, "master": 3, "phd": 4}
+
+# precompiled regexes (hot path: every upload / filter request)
+EMAIL_RE = re.compile(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}")
+PHONE_RE = re.compile(r"\+?\d[\d\s().-]{7,}\d")
+MONTH_YEAR_RE = re.compile(r"([A-Za-z]{3,9})\s+(\d{4})")
+YEAR_PREFIX_RE = re.compile(r"(\d{4})")
+# single scanner for both range styles:
+#   m/me: "Feb 2021 - Mar 2023" or "February 2021 – Present"
+#   y/ye: "2020 - 2022" or "2018 - Present"
+COMBINED_RANGE_RE = re.compile(
+    r"(?P<m>[A-Za-z]{3,9}\s+\d{4})\s*[-–—]\s*(?P<me>Present|Now|[A-Za-z]{3,9}\s+\d{4})"
+    r"|(?P<y>\d{4})\s*[-–—]\s*(?P<ye>Present|Now|\d{4})",
+    flags=re.IGNORECASE,
+)
+SENT_SPLIT_RE = re.compile(r"[.!?]\s+")
+YEAR_RE = re.compile(r"\b(19|20)\d{2}\b")
+EDU_SENT_RE = re.compile(
+    r"\b(university|bachelor|master|phd|degree|diploma|s1|s2|s3|sarjana|magister)\b",
+    flags=re.I,
+)
+EXP_YEARS_RE = re.compile(r"(\d+)\s*\+?\s*(?:years?|yrs?)")
+# one alternation per level, checked in DEGREE_LEVELS order
+DEGREE_RES = {
+    level: re.compile(rf"\b(?:{'|'.join(map(re.escape, kws))})\b", re.I)
+    for level, kws in DEGREE_LEVELS.items()
+}
+
 
 def parse_month_year(s: str) -> Optional[datetime]:
     if not s or not s.strip():
         return None
     s = s.strip()
-    m = re.match(r"([A-Za-z]{3,9})\s+(\d{4})", s)
+    m = MONTH_YEAR_RE.match(s)
     if m:
         mon, yr = m.groups()
         mon_key = mon[:3].lower()
@@ -83,7 +209,7 @@ def parse_month_year(s: str) -> Optional[datetime]:
             return datetime(int(yr), month or 1, 1)
         except Exception:
             return None
-    m2 = re.match(r"(\d{4})", s)
+    m2 = YEAR_PREFIX_RE.match(s)
     if m2:
         yr = int(m2.group(1))
         try:
@@ -116,25 +242,19 @@ def estimate_experience_years(text: str) -> float:
     now = datetime.now()
     ranges: List[tuple] = []
 
-    # Pattern: "Feb 2021 - Mar 2023" or "February 2021 – Present"
-    pattern_month_range = re.compile(
-        r"([A-Za-z]{3,9}\s+\d{4})\s*[-–—]\s*(Present|Now|(?:[A-Za-z]{3,9}\s+\d{4}))",
-        flags=re.IGNORECASE,
-    )
-    for m in pattern_month_range.finditer(text):
-        start_raw, end_raw = m.groups()
-        s = parse_month_year(start_raw)
-        if end_raw.lower() in ("present", "now"):
-            e = now
-        else:
-            e = parse_month_year(end_raw)
-        if s and e and e >= s:
-            ranges.append((s, e))
+    for m in COMBINED_RANGE_RE.finditer(text):
+        if m.group("m"):
+            start_raw, end_raw = m.group("m", "me")
+            s = parse_month_year(start_raw)
+            if end_raw.lower() in ("present", "now"):
+                e = now
+            else:
+                e = parse_month_year(end_raw)
+            if s and e and e >= s:
+                ranges.append((s, e))
+            continue
 
-    # Pattern: "2020 - 2022" or "2018 - Present"
-    pattern_year_range = re.compile(r"(\d{4})\s*[-–—]\s*(Present|Now|\d{4})", flags=re.IGNORECASE)
-    for m in pattern_year_range.finditer(text):
-        sy, ey_raw = m.groups()
+        sy, ey_raw = m.group("y", "ye")
         try:
             s = datetime(int(sy), 1, 1)
         except:
@@ -154,14 +274,13 @@ def estimate_experience_years(text: str) -> float:
         total_years = sum(diff_years(s, e) for s, e in merged)
         return round(min(total_years, 50.0), 2)
 
-    # fallback: count "experience" sentences as proxy
-    doc = nlp(text)
-    experience_sentences = [sent for sent in doc.sents if "experience" in sent.text.lower()]
-    if experience_sentences:
-        return float(min(len(experience_sentences), 40))
+    # fallback: count "experience" sentences as proxy (cheap regex split, no spaCy)
+    exp_count = sum(1 for sent in SENT_SPLIT_RE.split(text) if "experience" in sent.lower())
+    if exp_count:
+        return float(min(exp_count, 40))
 
     # final fallback: year diff between min and max year found in doc
-    years_found = [int(y) for y in re.findall(r"\b(19|20)\d{2}\b", text)]
+    years_found = [int(y) for y in YEAR_RE.findall(text)]
     if years_found and len(years_found) >= 2:
         try:
             return float(min(max(years_found) - min(years_found), 50))
@@ -172,56 +291,99 @@ def estimate_experience_years(text: str) -> float:
 
 
 def detect_degree_level(edu_snippets: List[str]) -> Optional[str]:
-    text = " ".join(edu_snippets).lower()
-    for level, keywords in DEGREE_LEVELS.items():
-        for kw in keywords:
-            if re.search(rf"\b{re.escape(kw)}\b", text):
-                return level
+    text = " ".join(edu_snippets)
+    for level, pattern in DEGREE_RES.items():
+        if pattern.search(text):
+            return level
     return None
 
 
 # ---------- parsing single PDF to structured data ----------
-def parse_pdf_file(file: UploadFile) -> Dict[str, Any]:
-    # Return structured parsed resume (not storing original bytes)
+def read_pdf_text(stream) -> str:
+    # PDFium (C) text extraction: plain text stream per page, no layout analysis
+    pdf = pdfium.PdfDocument(stream)
     try:
-        with pdfplumber.open(file.file) as pdf:
-            text = ""
-            for page in pdf.pages:
-                text += (page.extract_text() or "") + "\n"
-    except Exception as e:
-        # If pdfplumber fails, raise
-        raise HTTPException(status_code=400, detail=f"Error reading PDF: {e}")
-
-    text = text.strip()
-    emails = re.findall(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}", text)
-    phones = re.findall(r"\+?\d[\d\s().-]{7,}\d", text)
+        pages = []
+        for page in pdf:
+            textpage = page.get_textpage()
+            pages.append(textpage.get_text_bounded())
+            textpage.close()
+            page.close()
+    finally:
+        pdf.close()
+    # join once and normalise PDFium's CRLF line breaks in a single pass
+    return "\n".join(pages).replace("\r\n", "\n") + "\n"
+
+
+def analyze_text(filename: str, text: str, doc: Doc) -> Dict[str, Any]:
+    # Return structured parsed resume from extracted text + its precomputed spaCy Doc
+    emails = EMAIL_RE.findall(text)
+    phones = PHONE_RE.findall(text)
 
     # detect canonical skills
     low_text = text.lower()
-    detected_skills = [s for s in SKILLS if s.lower() in low_text]
+    detected_skills = detect_skills(text)
 
     # education snippets
-    doc = nlp(text)
-    education_snips = [sent.text.strip() for sent in doc.sents if re.search(
-        r"\b(university|bachelor|master|phd|degree|diploma|s1|s2|s3|sarjana|magister)\b",
-        sent.text, flags=re.I
-    )]
+    education_snips = [sent.text.strip() for sent in doc.sents if EDU_SENT_RE.search(sent.text)]
 
     years_est = estimate_experience_years(text)
 
     parsed = {
-        "filename": file.filename,
+        "filename": filename,
         "email": emails,
         "phone": phones,
         "skills_detected": detected_skills,
         "education": education_snips,
+        "degree_level": detect_degree_level(education_snips),
         "total_experience_years": years_est,
         "full_text": text,
+        # precomputed once for filter-time matching
+        "full_text_low": low_text,
+        "skills_detected_low": frozenset(s.lower() for s in detected_skills),
+        "keywords_detected_low": frozenset(find_terms(KEYWORD_AC, low_text)),
         "uploaded_at": datetime.utcnow().isoformat(),
     }
     return parsed
 
 
+def parse_pdf_bytes(filename: str, data: bytes) -> Dict[str, Any]:
+    # Return structured parsed resume (not storing original bytes);
+    # raise plain ValueError (picklable across EXECUTOR workers) on bad PDFs
+    try:
+        text = read_pdf_text(BytesIO(data)).strip()
+    except Exception as e:
+        raise ValueError(f"Error reading PDF: {e}")
+    return analyze_text(filename, text, nlp(text))
+
+
+def _parse_bytes(filename: str, content: bytes, text_path: str) -> Dict[str, Any]:
+    # Runs in an EXECUTOR worker
+    parsed = parse_pdf_bytes(filename, content)
+
+    # keep resume text on disk (lowercased, for filter-time search), not in memory
+    parsed.pop("full_text")
+    with open(text_path, "w", encoding="utf-8") as fh:
+        fh.write(parsed.pop("full_text_low"))
+    parsed["text_path"] = text_path
+    return parsed
+
+
+def search_text_file(path: Optional[str], terms: List[Tuple[str, bytes]]) -> Set[str]:
+    # memory-map the stored lowercased text and search the raw bytes (no str copy);
+    # a missing text file (e.g. uploads/ cleaned) counts as no match
+    if not path or not terms:
+        return set()
+    try:
+        with open(path, "rb") as fh:
+            if os.fstat(fh.fileno()).st_size == 0:
+                return set()
+            with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return {t for t, t_bytes in terms if mm.find(t_bytes) != -1}
+    except FileNotFoundError:
+        return set()
+
+
 # -------------------- API models --------------------
 class FilterRequest(BaseModel):
     skills: List[str] = []
@@ -237,9 +399,58 @@ class CompareRequest(FilterRequest):
 app.mount("/files", StaticFiles(directory=UPLOAD_DIR), name="files")
 
 # ---------- Upload multiple resumes ----------
+# parse results of recent uploads, keyed by (hash of PDF bytes, date): re-uploading the
+# same file skips the worker entirely. The date is part of the key because
+# "Present"/"Now" experience ranges grow daily. Bounded LRU.
+PARSE_CACHE_MAXSIZE = 256
+PARSE_CACHE: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+
+
+def _parse_cache_get(key: tuple) -> Optional[Dict[str, Any]]:
+    cached = PARSE_CACHE.get(key)
+    if cached is None:
+        return None
+    PARSE_CACHE.move_to_end(key)
+    parsed = copy.deepcopy(cached)
+    parsed["uploaded_at"] = datetime.utcnow().isoformat()
+    return parsed
+
+
+def _parse_cache_put(key: tuple, parsed: Dict[str, Any]) -> None:
+    PARSE_CACHE[key] = copy.deepcopy(parsed)
+    if len(PARSE_CACHE) > PARSE_CACHE_MAXSIZE:
+        PARSE_CACHE.popitem(last=False)
+
+
+def _save_upload(path: str, content: bytes) -> None:
+    with open(path, "wb") as buffer:
+        buffer.write(content)
+
+
+def _submit_parse(loop: asyncio.AbstractEventLoop, filename: str, content: bytes, text_path: str) -> asyncio.Future:
+    try:
+        return loop.run_in_executor(EXECUTOR, _parse_bytes, filename, content, text_path)
+    except BrokenProcessPool:
+        _reset_executor(EXECUTOR)
+        return loop.run_in_executor(EXECUTOR, _parse_bytes, filename, content, text_path)
+
+
+def _discard_upload(save_path: str) -> None:
+    # remove the saved PDF (+ its text file, if the worker wrote one) of an upload that isn't stored
+    for path in (save_path, save_path + ".txt"):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
 @app.post("/upload/")
 async def upload_resumes(files: List[UploadFile] = File(...)):
     created = []
+    loop = asyncio.get_running_loop()
+    executor = EXECUTOR
+    pending = []  # (candidate_id, filename, save_name, cache key, parse future)
+    saves = []  # disk writes running in threads
     for f in files:
         if not f.filename.lower().endswith(".pdf"):
             continue
@@ -247,26 +458,57 @@ async def upload_resumes(files: List[UploadFile] = File(...)):
         # 🔹 Baca bytes sekali
         content = await f.read()
 
-        # 🔹 Simpan ke disk
         candidate_id = str(uuid.uuid4())
         save_name = f"{candidate_id}_{f.filename}"
         save_path = os.path.join(UPLOAD_DIR, save_name)
-        with open(save_path, "wb") as buffer:
-            buffer.write(content)
 
-        # 🔹 Parse pakai BytesIO (hindari pointer kosong)
-        parsed = parse_pdf_file(
-            UploadFile(filename=f.filename, file=BytesIO(content))
-        )
+        # 🔹 File yang sama sudah pernah di-parse hari ini -> pakai cache, tanpa worker
+        cache_key = (hashlib.blake2b(content, digest_size=16).hexdigest(), datetime.now().date())
+        cached = _parse_cache_get(cache_key)
+        if cached is not None:
+            cached["filename"] = f.filename
+            fut = loop.create_future()
+            fut.set_result(cached)
+        else:
+            # 🔹 Parse di worker process (paralel antar file, event loop tidak ke-block)
+            fut = _submit_parse(loop, f.filename, content, save_path + ".txt")
+        pending.append((candidate_id, f.filename, save_name, cache_key, fut))
+
+        # 🔹 Simpan ke disk di thread, jalan bareng parsing (parse pakai bytes di memori)
+        saves.append(asyncio.create_task(asyncio.to_thread(_save_upload, save_path, content)))
+
+    # 🔹 Satu file gagal tidak membatalkan file lain di batch yang sama
+    results = await asyncio.gather(*(fut for *_, fut in pending), return_exceptions=True)
+    await asyncio.gather(*saves)
+
+    if any(isinstance(r, BrokenProcessPool) for r in results):
+        _reset_executor(executor)
+    unexpected = next((r for r in results if isinstance(r, BaseException)
+                       and not isinstance(r, (ValueError, BrokenProcessPool))), None)
+    if unexpected is not None:
+        # nothing from this batch gets stored -> don't leave its files behind
+        for _, _, save_name, _, _ in pending:
+            _discard_upload(os.path.join(UPLOAD_DIR, save_name))
+        raise unexpected
+
+    failed = []
+    for (candidate_id, filename, save_name, cache_key, _), parsed in zip(pending, results):
+        if isinstance(parsed, (ValueError, BrokenProcessPool)):
+            _discard_upload(os.path.join(UPLOAD_DIR, save_name))
+            error = str(parsed) if isinstance(parsed, ValueError) else "Error reading PDF: parser worker crashed"
+            failed.append({"filename": filename, "error": error})
+            continue
 
-        parsed_resumes[candidate_id] = parsed
-        parsed_resumes[candidate_id]["id"] = candidate_id
-        parsed_resumes[candidate_id]["file_url"] = f"http://127.0.0.1:8000/files/{save_name}"
+        if cache_key not in PARSE_CACHE:
+            _parse_cache_put(cache_key, parsed)
+        parsed["id"] = candidate_id
+        parsed["file_url"] = f"http://127.0.0.1:8000/files/{save_name}"
+        store_resume(candidate_id, parsed)
 
         created.append({
             "id": candidate_id,
             "filename": parsed["filename"],
-            "file_url": parsed_resumes[candidate_id]["file_url"],
+            "file_url": parsed["file_url"],
             "email": parsed.get("email", []),
             "phone": parsed.get("phone", []),
             "skills_detected": parsed.get("skills_detected", []),
@@ -274,8 +516,9 @@ async def upload_resumes(files: List[UploadFile] = File(...)):
         })
 
     if not created:
-        raise HTTPException(status_code=400, detail="No valid PDF files uploaded.")
-    return {"uploaded": created, "total_stored": len(parsed_resumes)}
+        detail = "; ".join(f"{x['filename']}: {x['error']}" for x in failed) or "No valid PDF files uploaded."
+        raise HTTPException(status_code=400, detail=detail)
+    return {"uploaded": created, "failed": failed, "total_stored": len(META)}
 
 
 def apply_filters_and_scoring(req: FilterRequest, candidate_ids: Optional[List[str]] = None):
@@ -283,44 +526,65 @@ def apply_filters_and_scoring(req: FilterRequest, candidate_ids: Optional[List[s
     Core filter/scoring logic.
     If candidate_ids is provided → only process those candidates.
     """
-    if not parsed_resumes:
+    if not META:
         return []
 
     candidates_out = []
-    ids_to_process = candidate_ids or list(parsed_resumes.keys())
+    percents: List[tuple] = []  # (skill, experience, education, keyword) percent per candidate
+    ids_to_process = candidate_ids or list(META.keys())
+
+    req_skills = [s.strip().lower() for s in req.skills if s and s.strip()]
+    req_keywords = [k.strip().lower() for k in req.keywords if k and k.strip()]
+    req_skill_set = set(req_skills)
+    req_keyword_set = set(req_keywords)
+    req_edu = (req.education or "").strip().lower()
+    min_score = float(req.min_score or 0.0)
+
+    # canonical skills / common keywords are answered by the inverted indexes;
+    # only the remaining free-text terms need a scan of each candidate's text
+    index_hits: Dict[str, Set[str]] = {}
+    for s in req_skills:
+        if s in SKILLS_LOW:
+            index_hits[s] = SKILL_INDEX.get(s, set())
+    for k in req_keywords:
+        if k in COMMON_KEYWORDS:
+            index_hits[k] = KEYWORD_INDEX.get(k, set())
+    scan_terms = [(t, t.encode("utf-8")) for t in req_skill_set | req_keyword_set if t not in index_hits]
 
     for cid in ids_to_process:
-        if cid not in parsed_resumes:
+        # runs in a worker thread: read columns defensively (upload/clear may run concurrently)
+        r = META.get(cid)
+        if r is None:
             continue
-        r = parsed_resumes[cid]
-        text_low = r.get("full_text", "").lower()
-        detected_low = [s.lower() for s in r.get("skills_detected", [])]
+        detected_low_set = SKILL_SETS.get(cid, frozenset())
+
+        found_terms = search_text_file(TEXT_PATHS.get(cid), scan_terms)
+        found_terms.update(t for t, ids in index_hits.items() if cid in ids)
 
         # --- Skills
-        req_skills = [s.strip().lower() for s in req.skills if s and s.strip()]
-        matched_skills = [s for s in req_skills if (s in text_low or s in detected_low)]
-        missing_skills = [s for s in req_skills if s not in matched_skills]
+        # set ops for membership; lists keep request order (and duplicates) for display
+        matched_skill_set = {s for s in req_skill_set if s in found_terms or s in detected_low_set}
+        matched_skills = [s for s in req_skills if s in matched_skill_set]
+        missing_skills = [s for s in req_skills if s not in matched_skill_set]
         skill_percent = (len(matched_skills) / len(req_skills) * 100.0) if req_skills else 100.0
 
         # --- Experience
-        years = float(r.get("total_experience_years") or 0.0)
+        years = YEARS.get(cid, 0.0)
         exp_percent = 100.0 if not req.min_experience else round(min(100.0, (years / req.min_experience) * 100.0), 2)
 
         # --- Education
-        req_edu = (req.education or "").strip().lower()
-        found_degree = detect_degree_level(r.get("education", []))
+        found_degree = DEG.get(cid)
         edu_percent, edu_reject = 100.0, False
         if req_edu:
-            if not found_degree or \
-               (["highschool", "diploma", "bachelor", "master", "phd"].index(found_degree)
-                < ["highschool", "diploma", "bachelor", "master", "phd"].index(req_edu)
-                if req_edu in ["highschool","diploma","bachelor","master","phd"] else -1):
+            # unknown required level can't be satisfied -> reject (same as before)
+            if not found_degree or req_edu not in DEGREE_ORDER or \
+               DEGREE_ORDER[found_degree] < DEGREE_ORDER[req_edu]:
                 edu_percent, edu_reject = 0.0, True
 
         # --- Keywords
-        req_keywords = [k.strip().lower() for k in req.keywords if k and k.strip()]
-        matched_keywords = [k for k in req_keywords if k in text_low]
-        missing_keywords = [k for k in req_keywords if k not in matched_keywords]
+        matched_keyword_set = req_keyword_set & found_terms
+        matched_keywords = [k for k in req_keywords if k in matched_keyword_set]
+        missing_keywords = [k for k in req_keywords if k not in matched_keyword_set]
         keyword_percent = (len(matched_keywords) / len(req_keywords) * 100.0) if req_keywords else 100.0
 
         # --- Reject reasons
@@ -334,19 +598,8 @@ def apply_filters_and_scoring(req: FilterRequest, candidate_ids: Optional[List[s
         if missing_keywords:
             reject_reasons.append("Missing required keywords: " + ", ".join(missing_keywords))
 
-        # --- Weighted score
-        score = (
-            (skill_percent * 0.55) +
-            (exp_percent * 0.25) +
-            (edu_percent * 0.10) +
-            (keyword_percent * 0.10)
-        )
-
-        passed = False
-        if req.mode == "strict":
-            passed = (len(reject_reasons) == 0) and (score >= float(req.min_score or 0.0))
-        else:
-            passed = score >= float(req.min_score or 0.0)
+        # --- Percents for the weighted score (computed for all candidates after the loop)
+        percents.append((skill_percent, exp_percent, edu_percent, keyword_percent))
 
         candidate_result = {
             "id": cid,
@@ -364,8 +617,8 @@ def apply_filters_and_scoring(req: FilterRequest, candidate_ids: Optional[List[s
             "keywords_required": req.keywords,
             "keywords_matched": matched_keywords,
             "keywords_missing": missing_keywords,
-            "score": round(score, 2),
-            "passed": passed,
+            "score": None,  # filled in after the loop
+            "passed": False,
             "reject_reasons": reject_reasons,
             "mode_used": req.mode,
             "weights": {
@@ -378,22 +631,49 @@ def apply_filters_and_scoring(req: FilterRequest, candidate_ids: Optional[List[s
 
         candidates_out.append(candidate_result)
 
-    candidates_out.sort(key=lambda x: x["score"], reverse=True)
-    return candidates_out
+    if not candidates_out:
+        return candidates_out
+
+    # --- Weighted score, vectorized over all candidates; column-wise terms summed
+    # left to right so results are bit-identical to the scalar formula
+    p = np.array(percents).reshape(-1, 4)
+    scores = (
+        (p[:, 0] * 0.55) +
+        (p[:, 1] * 0.25) +
+        (p[:, 2] * 0.10) +
+        (p[:, 3] * 0.10)
+    )
+    for c, score in zip(candidates_out, scores.tolist()):
+        c["score"] = round(score, 2)
+        if req.mode == "strict":
+            c["passed"] = (len(c["reject_reasons"]) == 0) and (score >= min_score)
+        else:
+            c["passed"] = score >= min_score
+
+    # rank by score, highest first (stable: ties keep upload order)
+    order = np.argsort(-np.array([c["score"] for c in candidates_out]), kind="stable")
+    return [candidates_out[i] for i in order]
 
 
 
 # ---------- Filter all stored resumes ----------
 @app.post("/filter/")
 async def filter_all(req: FilterRequest = Body(...)):
-    if not parsed_resumes:
+    if not META:
         return {"candidates": [], "message": "No resumes uploaded yet."}
-    candidates_out = apply_filters_and_scoring(req)
+    # disk reads (mmap'd resume text) -> keep them off the event loop
+    candidates_out = await run_in_threadpool(apply_filters_and_scoring, req)
     return {"candidates": candidates_out, "total": len(candidates_out)}
 
 
 
 # ---------- Export shortlist as CSV ----------
+class _EchoBuffer:
+    # file-like object for csv.writer: write() hands the formatted row back
+    def write(self, value: str) -> str:
+        return value
+
+
 @app.post("/export/")
 async def export_csv(req: FilterRequest = Body(...)):
     """
@@ -402,38 +682,37 @@ async def export_csv(req: FilterRequest = Body(...)):
     resp = await filter_all(req)  # reuse filter logic
     candidates = resp.get("candidates", [])
 
-    # create CSV in-memory
-    output = io.StringIO()
-    writer = csv.writer(output)
-    # header
-    writer.writerow([
-        "id", "filename", "email", "phone", "score", "passed",
-        "skills_required", "skills_matched", "skills_missing",
-        "experience_years", "education_found_level", "keywords_required", "keywords_matched",
-        "reject_reasons"
-    ])
-    for c in candidates:
-        writer.writerow([
-            c.get("id"),
-            c.get("filename"),
-            ";".join(c.get("email", [])),
-            ";".join(c.get("phone", [])),
-            c.get("score"),
-            c.get("passed"),
-            ";".join(c.get("skills_required", [])) if c.get("skills_required") else "",
-            ";".join(c.get("skills_matched", [])) if c.get("skills_matched") else "",
-            ";".join(c.get("skills_missing", [])) if c.get("skills_missing") else "",
-            c.get("total_experience_years"),
-            c.get("education_found_level"),
-            ";".join(c.get("keywords_required", [])) if c.get("keywords_required") else "",
-            ";".join(c.get("keywords_matched", [])) if c.get("keywords_matched") else "",
-            ";".join(c.get("reject_reasons", [])) if c.get("reject_reasons") else ""
+    # stream CSV row by row (csv.writer over a pass-through buffer keeps quoting)
+    writer = csv.writer(_EchoBuffer())
+
+    def rows():
+        yield writer.writerow([
+            "id", "filename", "email", "phone", "score", "passed",
+            "skills_required", "skills_matched", "skills_missing",
+            "experience_years", "education_found_level", "keywords_required", "keywords_matched",
+            "reject_reasons"
         ])
+        for c in candidates:
+            yield writer.writerow([
+                c.get("id"),
+                c.get("filename"),
+                ";".join(c.get("email", [])),
+                ";".join(c.get("phone", [])),
+                c.get("score"),
+                c.get("passed"),
+                ";".join(c.get("skills_required", [])) if c.get("skills_required") else "",
+                ";".join(c.get("skills_matched", [])) if c.get("skills_matched") else "",
+                ";".join(c.get("skills_missing", [])) if c.get("skills_missing") else "",
+                c.get("total_experience_years"),
+                c.get("education_found_level"),
+                ";".join(c.get("keywords_required", [])) if c.get("keywords_required") else "",
+                ";".join(c.get("keywords_matched", [])) if c.get("keywords_matched") else "",
+                ";".join(c.get("reject_reasons", [])) if c.get("reject_reasons") else ""
+            ])
 
-    output.seek(0)
     filename = f"ats_export_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.csv"
     return StreamingResponse(
-        iter([output.getvalue()]),
+        rows(),
         media_type="text/csv",
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
@@ -451,10 +730,7 @@ async def upload_jd(file: UploadFile = File(...)):
     # baca PDF atau TXT
     try:
         if file.filename.lower().endswith(".pdf"):
-            import pdfplumber
-            with pdfplumber.open(file.file) as pdf:
-                for page in pdf.pages:
-                    text += (page.extract_text() or "") + "\n"
+            text = read_pdf_text(file.file)
         elif file.filename.lower().endswith(".txt"):
             text = (await file.read()).decode("utf-8", errors="ignore")
         else:
@@ -465,18 +741,17 @@ async def upload_jd(file: UploadFile = File(...)):
     text_low = text.lower()
 
     # --- Extract skills
-    detected_skills = [s for s in SKILLS if s.lower() in text_low]
+    detected_skills = detect_skills(text)
 
     # --- Extract min years exp (regex cari angka sebelum 'year(s)')
-    exp_match = re.search(r"(\d+)\s*\+?\s*(?:years?|yrs?)", text_low)
+    exp_match = EXP_YEARS_RE.search(text_low)
     min_experience = int(exp_match.group(1)) if exp_match else None
 
     # --- Extract education level
     edu_level = detect_degree_level([text])
 
     # --- Extract keywords (kata kunci unik non-skill, misal "leadership", "communication")
-    common_keywords = ["leadership", "communication", "problem solving", "teamwork"]
-    detected_keywords = [k for k in common_keywords if k in text_low]
+    detected_keywords = [k for k in COMMON_KEYWORDS if k in text_low]
 
     return {
         "filename": file.filename,
@@ -499,16 +774,16 @@ async def compare_candidates(payload: CompareRequest = Body(...)):
     if not payload.ids or len(payload.ids) < 2:
         raise HTTPException(status_code=400, detail="At least 2 candidates required for comparison")
 
-    candidates_out = apply_filters_and_scoring(payload, candidate_ids=payload.ids)
+    candidates_out = await run_in_threadpool(apply_filters_and_scoring, payload, candidate_ids=payload.ids)
 
     if len(candidates_out) < 2:
         raise HTTPException(status_code=400, detail="At least 2 valid candidates required")
 
-    # 🔑 Inject file_url dari parsed_resumes
+    # 🔑 Inject file_url dari META
     for c in candidates_out:
         cid = c["id"]
-        if cid in parsed_resumes:
-            c["file_url"] = parsed_resumes[cid].get("file_url")
+        if cid in META:
+            c["file_url"] = META[cid].get("file_url")
 
     return {"candidates": candidates_out}
     
@@ -517,5 +792,8 @@ async def compare_candidates(payload: CompareRequest = Body(...)):
 # ---------- Clear memory (testing only) ----------
 @app.post("/clear")
 async def clear_all():
-    parsed_resumes.clear()
-    return {"ok": True, "total_stored": len(parsed_resumes)}
+    for column in (META, TEXT_PATHS, SKILL_SETS, YEARS, DEG):
+        column.clear()
+    SKILL_INDEX.clear()
+    KEYWORD_INDEX.clear()
+    return {"ok": True, "total_stored": len(META)}